@@ -1,23 +1,35 @@
 # decomposer.py
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import io
 import json
 import os
-import time
 import argparse
+import multiprocessing
 import logging
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import Select, WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import (
-        TimeoutException, NoSuchElementException, WebDriverException
+from playwright.sync_api import (
+        Error as PlaywrightError, TimeoutError as PlaywrightTimeoutError,
+        sync_playwright
 )
 
+HOLDINGS_COLUMNS = [
+    'Ticker', 'Holdings', 'CUSIP', 'SEDOL', '% of fund', 'Shares',
+    'Market value'
+]
+
+# equity holdings table (first tab) and its page selector
+TABLE_CSS = ("holding-details-container c11n-tab-panel:nth-of-type(1) "
+             "holding-details-results table")
+PAGINATION_CSS = "holding-details-pagination select"
+ROWS_CSS = f"{TABLE_CSS} tbody > tr"
+
 # add logging
 logging.basicConfig(
     level=logging.INFO,
     format='%(message)s',
 )
+logger = logging.getLogger(__name__)
 
 
 def load_etf_positions(file_path):
@@ -26,98 +38,152 @@ def load_etf_positions(file_path):
         with open(file_path, 'r') as f:
             return json.load(f)
     except FileNotFoundError:
-        logging.error(f"ETF positions file '{file_path}' not found.")
+        logger.error("ETF positions file '%s' not found.", file_path)
         return {}
     except json.JSONDecodeError as e:
-        logging.error(f"Error decoding JSON: {e}")
+        logger.error("Error decoding JSON: %s", e)
         return {}
 
 
-def scrape_vanguard_etf(driver, etf_ticker):
+def scrape_vanguard_etf(page, etf_ticker):
     """Scrape ETF holdings data from Vanguard website."""
     base_url = ('https://investor.vanguard.com/investment-products/etfs/'
                 'profile/{}#portfolio-composition')
     url = base_url.format(etf_ticker.lower())
-    logging.info(f"Accessing URL: {url}")
+    logger.info("Accessing URL: %s", url)
 
     try:
-        driver.get(url)
-    except WebDriverException as e:
-        logging.error(f"Error accessing URL for {etf_ticker}: {e}")
-        return []
+        page.goto(url)
+    except PlaywrightError as e:
+        logger.error("Error accessing URL for %s: %s", etf_ticker, e)
+        return pd.DataFrame(columns=HOLDINGS_COLUMNS)
 
     all_data = []
 
-    equity_table_xpath = '/html/body/vmf-root/vg-vgn-nav/profile/div/div[2]/portfolio/section/div/div[3]/div[3]/div/holding-details-container/div/div[1]/div/c11n-tabs/c11n-tab-panel[1]/div/div/holding-details-results/div/div[2]/table'
-
-    pagination_select_xpath = '/html/body/vmf-root/vg-vgn-nav/profile/div/div[2]/portfolio/section/div/div[3]/div[3]/div/holding-details-container/div/div[2]/div/div[1]/holding-details-pagination/div/div/vmf-pagination/div/div/div/c11n-select/div/select'
-
     def extract_table_data():
         try:
-            # try adjusting the number
-            table = WebDriverWait(driver, 7).until(
-                EC.presence_of_element_located((By.XPATH, equity_table_xpath))
+            # read every cell of the page in a single evaluation
+            rows = page.eval_on_selector_all(
+                ROWS_CSS,
+                "rs => rs.map(r => [...r.children]"
+                ".map(c => c.innerText.trim()))"
             )
-            rows = table.find_elements(By.XPATH, './/tbody/tr')
-            logging.info(f"Rows found: {len(rows)}")
-            return [[cell.text for cell in row.find_elements(
-                By.XPATH, './/th|.//td')] for row in rows]
-        except TimeoutException:
-            logging.error(f"Timeout waiting for table to appear for {etf_ticker}")
-            return []
-        except NoSuchElementException:
-            logging.error(f"Table element not found for {etf_ticker}")
-            return []
+            logger.info("Rows found: %d", len(rows))
+            return rows
         except Exception as e:
-            logging.error(f"Unexpected error extracting table data for {etf_ticker}: {e}")
+            logger.error("Unexpected error extracting table data for %s: %s",
+                         etf_ticker, e)
             return []
 
     try:
-        logging.info(f"Waiting for pagination select to be present for {etf_ticker}")
-        select = Select(WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located(
-                (By.XPATH, pagination_select_xpath)
-            )
-        ))
-        total_pages = len(select.options)
-        logging.info(f"Pagination select found. Total pages: {total_pages}")
+        logger.info("Waiting for pagination select to be present for %s",
+                    etf_ticker)
+        page.wait_for_selector(PAGINATION_CSS, state='attached',
+                               timeout=10000)
+        # bind one select so the page count and page changes agree
+        pagination = page.locator(PAGINATION_CSS).first
+        total_pages = pagination.locator("option").count()
+        logger.info("Pagination select found. Total pages: %d", total_pages)
+        page.wait_for_selector(TABLE_CSS, state='attached', timeout=10000)
 
         for index in range(total_pages):
-            logging.info(f"Processing page {index + 1}/{total_pages} "
-                         f"for {etf_ticker}")
-            select.select_by_index(index)
-            time.sleep(2)
+            logger.info("Processing page %d/%d for %s",
+                        index + 1, total_pages, etf_ticker)
+            if index > 0:
+                # wait for the previous page's rows to be swapped out and
+                # the new page's rows to be rendered
+                old_row = page.query_selector(ROWS_CSS)
+                pagination.select_option(index=index)
+                page.wait_for_function("row => !row || !row.isConnected",
+                                       arg=old_row, timeout=10000)
+                page.wait_for_selector(ROWS_CSS, state='attached',
+                                       timeout=10000)
             page_data = extract_table_data()
-            logging.info(f"Extracted {len(page_data)} rows from page {index + 1}")
+            logger.info("Extracted %d rows from page %d",
+                        len(page_data), index + 1)
             all_data.extend(page_data)
-    except TimeoutException:
-        logging.error(f"Timeout waiting for pagination select for {etf_ticker}")
-    except NoSuchElementException:
-        logging.error(f"Pagination select element not found for {etf_ticker}")
+    except PlaywrightTimeoutError:
+        logger.error("Timeout waiting for holdings page for %s", etf_ticker)
     except Exception as e:
-        logging.error(f"Unexpected error scraping {etf_ticker}: {e}")
-
-    logging.info(f"Total rows extracted for {etf_ticker}: {len(all_data)}")
-    return all_data
-
-
-def save_to_csv(data, etf_ticker):
-    """Save scraped data to a CSV file in the 'scraped' directory."""
-    filename = os.path.join("scraped", f"{etf_ticker}.csv")
-    if data:
-        df = pd.DataFrame(data, columns=[
-            'Ticker', 'Holdings', 'CUSIP', 'SEDOL', '% of fund',
-            'Shares', 'Market value'
-        ])
-        df.to_csv(filename, index=False)
-        logging.info(f"Data saved to {filename}")
+        logger.error("Unexpected error scraping %s: %s", etf_ticker, e)
+
+    logger.info("Total rows extracted for %s: %d", etf_ticker, len(all_data))
+    return pd.DataFrame(all_data, columns=HOLDINGS_COLUMNS)
+
+
+def _clean_holdings(df):
+    """Convert raw holdings cells to Arrow strings, with float weights/values."""
+    df = df.astype(pd.ArrowDtype(pa.string())).replace('', pd.NA)
+    df['Market value'] = df['Market value'].str.replace(
+        r'[\$,]', '', regex=True
+    ).astype('float64[pyarrow]').fillna(0)
+    df['% of fund'] = df['% of fund'].str.replace(
+        r'[%]', '', regex=True
+    ).astype('float64[pyarrow]').fillna(0)
+    return df
+
+
+def save_holdings(df, etf_ticker):
+    """Save cleaned holdings to a Parquet file in the 'scraped' directory."""
+    filename = os.path.join("scraped", f"{etf_ticker}.parquet")
+    if not df.empty:
+        df.to_parquet(filename, index=False, compression='zstd')
+        logger.info("Data saved to %s", filename)
     else:
-        logging.warning(f"No data to save for {filename}")
+        logger.warning("No data to save for %s", filename)
 
 
-def aggregate_holdings(etf_positions):
-    """Aggregate holdings across all ETFs."""
-    all_holdings = pd.DataFrame()
+def _scrape_one(etf):
+    """Scrape a single ETF with its own headless Chromium (pool worker)."""
+    with sync_playwright() as playwright:
+        try:
+            # images are never scraped, so don't download or render them
+            browser = playwright.chromium.launch(headless=True, args=[
+                "--disable-gpu",
+                "--no-sandbox",
+                "--blink-settings=imagesEnabled=false",
+            ])
+        except PlaywrightError as e:
+            logger.error("Error launching browser for %s: %s", etf, e)
+            return etf, None
+
+        try:
+            logger.info("Scraping data for %s...", etf)
+            page = browser.new_page()
+            holdings = _clean_holdings(scrape_vanguard_etf(page, etf))
+            save_holdings(holdings, etf)
+        except Exception as e:
+            # keep one bad ETF from taking down the whole pool
+            logger.error("Error scraping or cleaning data for %s: %s", etf, e)
+            return etf, None
+        finally:
+            browser.close()
+    return etf, holdings
+
+
+def _compute_values(pct, mv, etf_ids, etf_values):
+    """Compute the dollar value of every holding across all ETFs at once.
+
+    ``etf_ids`` maps each row of ``pct``/``mv`` to its position in
+    ``etf_values``. Rows whose % of fund is zero fall back to their share
+    of that ETF's total market value.
+    """
+    mv_totals = np.bincount(etf_ids, weights=mv, minlength=len(etf_values))
+    # both branches are evaluated; ETFs with no market value divide by zero
+    with np.errstate(divide='ignore', invalid='ignore'):
+        weight = np.where(pct != 0, pct * 0.01, mv / mv_totals[etf_ids])
+    return etf_values[etf_ids] * weight
+
+
+def aggregate_holdings(etf_positions, cached=None):
+    """Aggregate holdings across all ETFs.
+
+    ``cached`` maps ETF tickers to freshly scraped, already cleaned
+    DataFrames, which are used instead of re-reading their Parquet cache.
+    """
+    cached = cached or {}
+    frames = {}
+    etf_values = []
     etf_summary = []
     for etf, position_data in etf_positions.items():
         etf_summary.append({
@@ -125,55 +191,73 @@ def aggregate_holdings(etf_positions):
             'Shares': position_data['shares'],
             'Price': position_data['price']
         })
+        parquet_file = os.path.join("scraped", f"{etf}.parquet")
         csv_file = os.path.join("scraped", f"{etf}.csv")
-        if os.path.exists(csv_file):
-            df = pd.read_csv(csv_file)
-            df['Market value'] = df['Market value'].str.replace(
-                r'[\$,]', '', regex=True
-            ).astype(float)
-            df['% of fund'] = df['% of fund'].str.replace(
-                r'[%]', '', regex=True
-            ).astype(float).fillna(0)
-            total_market_value = df['Market value'].sum()
-
-            df['Weight'] = df['% of fund'] / 100
-
-            zero_weight_rows = df['Weight'] == 0
-            df.loc[zero_weight_rows, 'Weight'] = (
-                df.loc[zero_weight_rows, 'Market value'] / total_market_value
+        if etf in cached:
+            df = cached[etf]
+        elif os.path.exists(parquet_file):
+            df = pd.read_parquet(
+                parquet_file,
+                columns=['Ticker', '% of fund', 'Market value'],
+                dtype_backend='pyarrow',
             )
-
-            etf_value = position_data['shares'] * position_data['price']
-            df['Value'] = etf_value * df['Weight']
-            df['Ticker'] = df['Ticker'].str.upper()
-            df = df[['Ticker', 'Value']]
-
-            df = df.groupby('Ticker', as_index=False).sum()
-            df.rename(columns={'Value': f"Value of Ticker in {etf.upper()}"},
-                      inplace=True)
-            if all_holdings.empty:
-                all_holdings = df
-            else:
-                all_holdings = pd.merge(
-                    all_holdings, df, on='Ticker', how='outer'
-                )
+        elif os.path.exists(csv_file):
+            # CSV caches written by older versions still hold raw strings
+            df = _clean_holdings(pd.read_csv(
+                csv_file,
+                engine='pyarrow',
+                dtype_backend='pyarrow',
+                usecols=['Ticker', '% of fund', 'Market value'],
+            ))
         else:
-            logging.warning(
-                f"Holdings file '{csv_file}' not found for ETF '{etf}'. "
-                "Skipping."
+            logger.warning(
+                "Holdings file '%s' not found for ETF '%s'. Skipping.",
+                parquet_file, etf
             )
+            continue
 
-    if not all_holdings.empty:
-        all_holdings.fillna(0, inplace=True)
-        numeric_cols = [col for col in all_holdings.columns if col != 'Ticker']
-        all_holdings['Total'] = all_holdings[numeric_cols].sum(axis=1)
-        return pd.DataFrame(etf_summary), all_holdings.sort_values(
-            'Total', ascending=False
-        )
-    else:
-        logging.error("No holdings data available to aggregate.")
+        frames[etf] = df
+        etf_values.append(position_data['shares'] * position_data['price'])
+
+    if not frames:
+        logger.error("No holdings data available to aggregate.")
         return pd.DataFrame(), pd.DataFrame()
 
+    # value every holding of every ETF in a single vectorized pass
+    lengths = [len(df) for df in frames.values()]
+    values = _compute_values(
+        np.concatenate([df['% of fund'].to_numpy() for df in frames.values()]),
+        np.concatenate([df['Market value'].to_numpy()
+                        for df in frames.values()]),
+        np.repeat(np.arange(len(frames)), lengths),
+        np.asarray(etf_values, dtype=float),
+    )
+
+    series_list = []
+    for (etf, df), etf_holding_values in zip(
+            frames.items(), np.split(values, np.cumsum(lengths)[:-1])):
+        df = df.assign(Value=etf_holding_values)
+        # Vanguard already lists tickers upper-cased; only fix the rare stray
+        if df['Ticker'].str.contains(r'[a-z]', regex=True).any():
+            df['Ticker'] = df['Ticker'].str.upper()
+        df = df.dropna(subset=['Ticker'])
+
+        # holdings normally list each ticker once; only collapse dupes
+        if df['Ticker'].is_unique:
+            holding_values = df.set_index('Ticker')['Value']
+        else:
+            holding_values = df.groupby('Ticker')['Value'].sum()
+        col_name = f"Value of Ticker in {etf.upper()}"
+        series_list.append(holding_values.rename(col_name))
+
+    # align every ETF on the Ticker index in one pass
+    all_holdings = pd.concat(series_list, axis=1).fillna(0)
+    all_holdings['Total'] = all_holdings.sum(axis=1)
+    all_holdings = all_holdings.sort_values(
+        'Total', ascending=False
+    ).reset_index()
+    return pd.DataFrame(etf_summary), all_holdings
+
 
 def main():
     parser = argparse.ArgumentParser(description="ETF-it: Decompose and Analyze Vanguard ETFs")
@@ -185,55 +269,64 @@ def main():
 
     etf_positions = load_etf_positions(args.positions)
     if not etf_positions:
-        logging.error("No ETF positions to process. Exiting.")
+        logger.error("No ETF positions to process. Exiting.")
         return
 
     if not os.path.exists("scraped"):
         os.makedirs("scraped")
 
-    try:
-        driver = webdriver.Chrome()  # Ensure chromedriver in PATH
-    except WebDriverException as e:
-        logging.error(f"Error initializing WebDriver: {e}")
-        return
-
-    try:
-        for etf in etf_positions:
-            csv_file = os.path.join("scraped", f"{etf}.csv")
-            if not os.path.exists(csv_file):
-                logging.info(f"Scraping data for {etf}...")
-                holdings_data = scrape_vanguard_etf(driver, etf)
-                save_to_csv(holdings_data, etf)
-            else:
-                logging.info(f"Using existing data for {etf}")
-    finally:
-        driver.quit()
-    logging.info("Aggregating holdings...")
-    etf_summary, aggregated_holdings = aggregate_holdings(etf_positions)
+    to_scrape = []
+    for etf in etf_positions:
+        cache_files = [os.path.join("scraped", f"{etf}.{ext}")
+                       for ext in ("parquet", "csv")]
+        if not any(os.path.exists(path) for path in cache_files):
+            to_scrape.append(etf)
+        else:
+            logger.info("Using existing data for %s", etf)
+
+    # the sync playwright API isn't thread-safe, so each worker process
+    # launches its own browser
+    fresh = {}
+    if to_scrape:
+        processes = min(len(to_scrape), os.cpu_count() or 1)
+        with multiprocessing.Pool(processes=processes) as pool:
+            for etf, holdings in pool.imap_unordered(_scrape_one, to_scrape):
+                logger.info("Finished scraping %s", etf)
+                if holdings is not None and not holdings.empty:
+                    fresh[etf] = holdings
+    logger.info("Aggregating holdings...")
+    etf_summary, aggregated_holdings = aggregate_holdings(
+        etf_positions, cached=fresh
+    )
 
     if not aggregated_holdings.empty:
-        logging.info("Saving aggregated holdings...")
+        logger.info("Saving aggregated holdings...")
 
+        # render both tables into memory and write the file in one go
+        buf = io.StringIO()
+        etf_summary.to_csv(buf, index=False)
+        buf.write("\n")  # Add an empty row
+        aggregated_holdings.to_csv(buf, index=False)
         with open("aggregated_holdings.csv", "w") as f:
-            etf_summary.to_csv(f, index=False)
-            f.write("\n")  # Add an empty row
-            aggregated_holdings.to_csv(f, index=False)
-        logging.info("Analysis complete. Results saved in "
-                     "aggregated_holdings.csv")
+            f.write(buf.getvalue())
+        logger.info("Analysis complete. Results saved in "
+                    "aggregated_holdings.csv")
 
         # print summary statistics
         total_portfolio_value = aggregated_holdings['Total'].sum()
-        logging.info(f"\nTotal portfolio value: ${total_portfolio_value:,.2f}")
-        logging.info("\nTop 10 ETF component holdings by value:")
+        logger.info("\nTotal portfolio value: $%s",
+                    format(total_portfolio_value, ",.2f"))
+        logger.info("\nTop 10 ETF component holdings by value:")
         top_10 = aggregated_holdings.head(10)
         for _, row in top_10.iterrows():
             ticker = row['Ticker']
             total_value = row['Total']
             percentage = (total_value / total_portfolio_value) * 100
-            logging.info(f"{ticker}: ${total_value:,.2f} ({percentage:.2f}%)")
+            logger.info("%s: $%s (%.2f%%)",
+                        ticker, format(total_value, ",.2f"), percentage)
     else:
-        logging.error("Aggregated holdings data is empty. "
-                      "No results to display.")
+        logger.error("Aggregated holdings data is empty. "
+                     "No results to display.")
 
 
 if __name__ == "__main__":